@@ -1,9 +1,27 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
 import subprocess
 import sys
 import os
 import re
-import requests
-import random
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Collection, Iterable, Iterator, Mapping
+from urllib.parse import urlparse
+
+import orjson
+
+# httpx 导入较慢，仅在确有链接需要处理时才在函数内导入，使无新链接的运行尽快结束
+if TYPE_CHECKING:
+    import httpx
 
 
 # --- [新增] 全局配置常量 ---
@@ -11,15 +29,55 @@ import random
 INPUT_FILE = "README.md"
 # 自动归档的目标文件
 CATEGORY_FILE = "category.md"
+# 摘要与分类结果的本地缓存，避免重复处理同一 URL
+CACHE_FILE = ".bookmark_cache.db"
+# 各类接口的最大并发请求数
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+FETCH_CONCURRENCY = 16
+CLOUDFLARE_CONCURRENCY = 2
+# LLM 接口每分钟最多请求次数，0 表示不限速
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+# 发送给 LLM 的文章内容最大字符数，超出部分将被截断
+MAX_SUMMARIZE_CHARS = int(os.getenv("MAX_SUMMARIZE_CHARS", "8000"))
+# 每次 LLM 请求合并处理的文章数量，1 表示逐篇请求
+BATCH_SIZE = max(1, int(os.getenv("BATCH_SIZE", "4")))
+# 设为 1 时改用 OpenAI Batch API 离线处理 (成本更低，但可能需要等待较长时间)
+USE_BATCH_API = os.getenv("USE_BATCH_API") == "1"
+# Batch API 任务状态的查询间隔与最长等待时间 (秒)
+BATCH_API_POLL_INTERVAL = 30
+BATCH_API_MAX_WAIT = int(os.getenv("BATCH_API_MAX_WAIT", "18000"))
+# HTTP 连接池大小，连接在各请求之间复用 (keep-alive)，支持的服务端会协商使用 HTTP/2 多路复用
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+# 失败重试策略: 最多重试次数、指数退避系数，以及需要重试的 HTTP 状态码
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUS_FORCELIST = frozenset({429, 500, 502, 503, 504})
+# 非幂等请求 (POST) 只在被限流时按状态码重试，此时服务端尚未处理该请求
+RETRY_STATUS_RATE_LIMITED = frozenset({429})
+# 可以安全重发的 HTTP 方法，读超时、服务端错误等情况只对这些方法重试
+RETRY_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"})
+# 服务端要求的 Retry-After 等待时间超过该秒数时不再重试
+RETRY_AFTER_MAX = 120
+
+# 预编译的正则表达式
+# Markdown 链接 [标题](URL)
+_LINK_RE = re.compile(r'\[(.+?)\]\((.+?)\)')
+# AI 返回的分类名称首尾多余的字符
+_TRIM_RE = re.compile(r'^[#*"\s]+|[#*"\s]+$')
+# 连续的空格/制表符，以及多个连续空行
+_INLINE_SPACES_RE = re.compile(r'[ \t]+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
 
 
 # --- [新增] 从环境变量获取 LLM API 配置 ---
-def get_api_config() -> dict | None:
+@lru_cache(maxsize=1)
+def get_api_config() -> Mapping[str, str] | None:
     """
-    从环境变量中获取并验证 LLM API 配置。
+    从环境变量中获取并验证 LLM API 配置。结果在进程内缓存，只读取一次环境变量。
 
     Returns:
-        dict: 包含 api_url, api_key, model 的字典，如果缺少任何必要配置则返回 None。
+        Mapping: 包含 api_url, api_key, model 的只读映射，如果缺少任何必要配置则返回 None。
     """
     # 从环境变量获取 API URL，这是必需的
     api_url = os.getenv("LLM_API_URL")
@@ -36,16 +94,17 @@ def get_api_config() -> dict | None:
     # 从环境变量获取模型名称，如果未设置则使用默认值
     model = os.getenv("LLM_MODEL_NAME", "deepseek-ai/DeepSeek-R1-0528-Qwen3-8B")
 
-    return {"api_url": api_url, "api_key": api_key, "model": model}
+    return MappingProxyType({"api_url": api_url, "api_key": api_key, "model": model})
 
 
 # --- [新增] 从环境变量获取 Cloudflare API 配置 ---
-def get_cloudflare_config() -> dict | None:
+@lru_cache(maxsize=1)
+def get_cloudflare_config() -> Mapping[str, str] | None:
     """
-    从环境变量中获取并验证 Cloudflare API 配置。
+    从环境变量中获取并验证 Cloudflare API 配置。结果在进程内缓存，只读取一次环境变量。
 
     Returns:
-        dict: 包含 account_id 和 api_token 的字典，如果缺少则返回 None。
+        Mapping: 包含 account_id 和 api_token 的只读映射，如果缺少则返回 None。
     """
     account_id = os.getenv("CLOUDFLARE_ACCOUNT_ID")
     if not account_id:
@@ -57,54 +116,161 @@ def get_cloudflare_config() -> dict | None:
         print("错误: 缺少环境变量 'CLOUDFLARE_API_TOKEN'。无法使用 Cloudflare 获取微信文章。", file=sys.stderr)
         return None
 
-    return {"account_id": account_id, "api_token": api_token}
+    return MappingProxyType({"account_id": account_id, "api_token": api_token})
 
 
-# --- [已修改] 使用环境变量配置的 OpenAI API 函数 ---
-def summarize_with_openai(content: str) -> str | None:
+# --- [新增] 共享连接池的 HTTP 客户端与重试 ---
+def create_http_client() -> httpx.AsyncClient:
     """
-    使用配置好的 OpenAI API 为给定文本生成摘要。
+    创建所有请求共享的 HTTP 客户端，通过连接池复用 TCP/TLS 连接。
+    启用 HTTP/2 后，同一主机的并发请求可在单个连接上多路复用。
     """
-    config = get_api_config()
-    if not config:
+    import httpx
+
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(600.0, connect=10.0),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS),
+    )
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """
+    解析 Retry-After 响应头 (秒数或 HTTP 日期)，返回需要等待的秒数，无法解析时返回 None。
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
         return None
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {config['api_key']}"
-    }
-    system_prompt = "你是一位专业的文章摘要助手。请将以下文章内容生成一段精炼的中文摘要，要求语言流畅、抓住核心要点，并严格控制在150个字以内。"
-    payload = {
-        "model": config['model'],
+
+async def http_request_with_retry(client: httpx.AsyncClient, method: str, url: str, retry_statuses: Collection[int] | None = None, before_attempt: Callable[[], Awaitable[None]] | None = None, **kwargs) -> httpx.Response:
+    """
+    发送 HTTP 请求，失败时按指数退避重试，策略与 urllib3 Retry 的默认行为一致:
+    连接阶段的错误 (请求尚未发出) 对所有方法重试；读超时等其余网络错误只对幂等方法重试；
+    状态码重试默认只用于幂等方法，非幂等请求需通过 retry_statuses 显式指定。
+    响应带有 Retry-After 头时按其等待，而不是使用退避时间。
+    响应体在返回前已被完整读取，调用方可直接使用 content/text。
+
+    Args:
+        retry_statuses: 需要重试的状态码，默认幂等方法为 RETRY_STATUS_FORCELIST，其他方法不按状态码重试。
+        before_attempt: 可选，每次发送请求 (包括重试) 前等待的协程函数，如速率限制。
+    """
+    import httpx
+
+    idempotent = method.upper() in RETRY_IDEMPOTENT_METHODS
+    if retry_statuses is None:
+        retry_statuses = RETRY_STATUS_FORCELIST if idempotent else frozenset()
+
+    for attempt in range(RETRY_TOTAL + 1):
+        retry_after = None
+        if before_attempt is not None:
+            await before_attempt()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+            if attempt == RETRY_TOTAL:
+                raise
+        except httpx.TransportError:
+            # 请求可能已被服务端处理，非幂等请求重发会导致重复执行 (及重复计费)
+            if not idempotent or attempt == RETRY_TOTAL:
+                raise
+        else:
+            if response.status_code not in retry_statuses or attempt == RETRY_TOTAL:
+                return response
+            retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None and retry_after > RETRY_AFTER_MAX:
+                return response
+        delay = retry_after if retry_after is not None else RETRY_BACKOFF_FACTOR * (2 ** attempt)
+        print(f"    > 请求 {url} 失败，{delay:.1f} 秒后进行第 {attempt + 1} 次重试...", file=sys.stderr)
+        await asyncio.sleep(delay)
+
+
+# --- [新增] 按接口划分的并发与速率限制 ---
+LLM_SEMAPHORE = asyncio.Semaphore(LLM_CONCURRENCY)
+FETCH_SEMAPHORE = asyncio.Semaphore(FETCH_CONCURRENCY)
+CLOUDFLARE_SEMAPHORE = asyncio.Semaphore(CLOUDFLARE_CONCURRENCY)
+
+# 最近 60 秒内 LLM 请求的发起时间，用于滑动窗口限速
+_llm_request_times: deque[float] = deque()
+_llm_rate_lock = asyncio.Lock()
+
+
+async def wait_for_llm_rate_limit():
+    """
+    按 LLM_RPM 控制 LLM 请求节奏：若最近 60 秒内的请求数已达上限，
+    则等待最早的一次请求滑出窗口后再放行。
+    """
+    if LLM_RPM <= 0:
+        return
+    async with _llm_rate_lock:
+        while True:
+            now = time.monotonic()
+            while _llm_request_times and now - _llm_request_times[0] >= 60:
+                _llm_request_times.popleft()
+            if len(_llm_request_times) < LLM_RPM:
+                _llm_request_times.append(now)
+                return
+            await asyncio.sleep(60 - (now - _llm_request_times[0]))
+
+
+# --- [新增] 压缩并截断发送给 LLM 的文章内容 ---
+def prepare_content_for_llm(content: str) -> str:
+    """
+    合并多余的空白后，将文章内容截断到 MAX_SUMMARIZE_CHARS 个字符以内，
+    以减少提示词 token 数量。
+    """
+    original_length = len(content)
+    # 合并空白只会让内容变短，先按宽松的上限截断，避免正则扫描整篇超长页面
+    content = content[:MAX_SUMMARIZE_CHARS * 4]
+    content = _INLINE_SPACES_RE.sub(' ', content)
+    content = _BLANK_LINES_RE.sub('\n\n', content).strip()
+    if len(content) > MAX_SUMMARIZE_CHARS or original_length > MAX_SUMMARIZE_CHARS * 4:
+        print(f"    > 文章内容共 {original_length} 个字符，截断为前 {MAX_SUMMARIZE_CHARS} 个字符后发送给 LLM。")
+        content = content[:MAX_SUMMARIZE_CHARS]
+    return content
+
+
+# --- [已修改] 使用 LLM 同时完成摘要与分类 ---
+# 摘要与分类两项任务的要求，单篇与批量请求共用
+SUMMARIZE_AND_CATEGORIZE_TASKS = (
+    "1. 摘要：将文章内容生成一段精炼的中文摘要，要求语言流畅、抓住核心要点，并严格控制在150个字以内。\n"
+    "2. 分类：根据文章的标题和内容，将其分配到一个最合适的类别中。"
+    "请严格从【已有类别】列表中选择一个。如果所有类别都不太合适，请创造一个新的、简洁的类别名称（例如 '云原生技术' 或 '产品与设计'）。"
+    "类别必须且只能是类别名称本身，不要包含任何多余的文字、解释或标点符号（如 '类别：' 或 '##'）。\n"
+)
+
+
+def build_llm_payload(model: str, system_prompt: str, user_content: str) -> dict:
+    """
+    构造要求以 JSON 对象回复的 Chat Completions 请求体。
+    """
+    return {
+        "model": model,
         "messages": [
             {"role": "system", "content": system_prompt},
-            {"role": "user", "content": content}
+            {"role": "user", "content": user_content}
         ],
-        "temperature": 0.3,
+        "temperature": 0.1,
+        "response_format": {"type": "json_object"},
     }
 
-    try:
-        print("    > 正在通过 requests 请求 LLM 生成摘要...")
-        response = requests.post(config['api_url'], headers=headers, json=payload, timeout=600)
-        response.raise_for_status()
-        response_data = response.json()
-        summary = response_data['choices'][0]['message']['content']
-        return summary.strip()
-    except requests.RequestException as e:
-        print(f"    > LLM API 请求失败 (网络错误): {e}", file=sys.stderr)
-        if e.response is not None:
-             print(f"    > 响应内容: {e.response.text}", file=sys.stderr)
-        return None
-    except (KeyError, IndexError) as e:
-        print(f"    > 解析 LLM 响应失败: 意外的格式。错误: {e}", file=sys.stderr)
-        return None
-
 
-# --- [已修改] 使用环境变量配置的 AI 分类函数 ---
-def categorize_with_openai(title: str, summary: str, existing_categories: list[str]) -> str | None:
+async def request_llm_json(client: httpx.AsyncClient, system_prompt: str, user_content: str, description: str) -> Any | None:
     """
-    使用配置好的 OpenAI API 对文章进行分类。
+    在并发与速率限制下请求 LLM，并将模型的回复解析为 JSON 对象。
+
+    Returns:
+        解析后的 JSON 对象，请求或解析失败时返回 None。
     """
+    import httpx
+
     config = get_api_config()
     if not config:
         return None
@@ -113,11 +279,58 @@ def categorize_with_openai(title: str, summary: str, existing_categories: list[s
         "Content-Type": "application/json",
         "Authorization": f"Bearer {config['api_key']}"
     }
+    payload = build_llm_payload(config['model'], system_prompt, user_content)
+
+    try:
+        async with LLM_SEMAPHORE:
+            print(f"    > 正在通过 httpx 请求 LLM {description}...")
+            # 每次尝试 (包括被限流后的重试) 都占用一个速率限制名额
+            response = await http_request_with_retry(
+                client, "POST", config['api_url'], headers=headers, content=orjson.dumps(payload),
+                retry_statuses=RETRY_STATUS_RATE_LIMITED, before_attempt=wait_for_llm_rate_limit,
+            )
+        if not response.is_success:
+            print(f"    > LLM API 请求失败 (HTTP {response.status_code})", file=sys.stderr)
+            print(f"    > 响应内容: {response.text}", file=sys.stderr)
+            return None
+        response_data = orjson.loads(response.content)
+        return orjson.loads(response_data['choices'][0]['message']['content'])
+    except httpx.HTTPError as e:
+        print(f"    > LLM API 请求失败 (网络错误): {e!r}", file=sys.stderr)
+        return None
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        print(f"    > 解析 LLM 响应失败: 意外的格式。错误: {e!r}", file=sys.stderr)
+        return None
+
+
+def _parse_summary_and_category(result: Any) -> tuple[str, str] | None:
+    """
+    从 LLM 返回的 {"summary": ..., "category": ...} 对象中取出摘要与分类。
+    """
+    try:
+        summary = result['summary'].strip()
+        # 移除AI可能返回的多余字符
+        category = _TRIM_RE.sub('', result['category'])
+    except (KeyError, TypeError, AttributeError) as e:
+        print(f"    > 解析 LLM 响应失败: 意外的格式。错误: {e!r}", file=sys.stderr)
+        return None
+
+    if not summary or not category:
+        print("    > 解析 LLM 响应失败: 摘要或分类为空。", file=sys.stderr)
+        return None
+    return summary, category
+
+
+def build_article_prompts(title: str, content: str, existing_categories: list[str]) -> tuple[str, str]:
+    """
+    构造单篇文章摘要与分类请求的 (system_prompt, user_content)。
+    content 应已经过 prepare_content_for_llm 处理。
+    """
     category_list_str = "\n".join(f"- {cat}" for cat in existing_categories)
     system_prompt = (
-        "你是一位智能分类助手。你的任务是根据文章的标题和摘要，将其分配到一个最合适的类别中。"
-        "请严格从以下【已有类别】列表中选择一个。如果所有类别都不太合适，请创造一个新的、简洁的类别名称（例如 '云原生技术' 或 '产品与设计'）。"
-        "你的回答必须且只能是类别名称本身，不要包含任何多余的文字、解释或标点符号（如 '类别：' 或 '##'）。"
+        "你是一位专业的文章摘要与智能分类助手。你需要完成两项任务：\n"
+        + SUMMARIZE_AND_CATEGORIZE_TASKS +
+        "Respond in strict JSON with keys summary and category."
     )
     user_content = f"""
 【已有类别】:
@@ -126,45 +339,233 @@ def categorize_with_openai(title: str, summary: str, existing_categories: list[s
 【文章标题】:
 {title}
 
-【文章摘要】:
-{summary}
+【文章内容】:
+{content}
+"""
+    return system_prompt, user_content.strip()
+
+
+async def summarize_and_categorize_with_openai(client: httpx.AsyncClient, title: str, content: str, existing_categories: list[str]) -> tuple[str, str] | None:
+    """
+    使用配置好的 OpenAI API 在一次请求中为文章生成摘要并完成分类，
+    避免为分类再次发送文章内容。
+
+    Returns:
+        tuple: (summary, category)，请求或解析失败时返回 None。
+    """
+    content = prepare_content_for_llm(content)
+    system_prompt, user_content = build_article_prompts(title, content, existing_categories)
+    result = await request_llm_json(client, system_prompt, user_content, "生成摘要并分类")
+    if result is None:
+        return None
+    return _parse_summary_and_category(result)
+
 
-请为以上内容选择或创建一个最合适的类别名称：
+# --- [新增] 一次 LLM 请求处理多篇文章 ---
+async def summarize_and_categorize_batch(client: httpx.AsyncClient, items: list[tuple[str, str]], existing_categories: list[str]) -> list[tuple[str, str] | None] | None:
+    """
+    将多篇文章编号后合并到一次 LLM 请求中，分别生成摘要与分类，
+    以分摊系统提示词与网络往返的开销。
+
+    Args:
+        items: (title, content) 列表。
+
+    Returns:
+        list: 与 items 一一对应的 (summary, category)，单篇解析失败时对应项为 None；
+        请求失败或返回的结果数量与文章数量不符时返回 None。
+    """
+    category_list_str = "\n".join(f"- {cat}" for cat in existing_categories)
+    articles_str = "\n\n".join(
+        f"【文章 {i}】\n标题: {title}\n内容:\n{prepare_content_for_llm(content)}"
+        for i, (title, content) in enumerate(items, 1)
+    )
+    system_prompt = (
+        "你是一位专业的文章摘要与智能分类助手。你将收到多篇编号的文章，需要对每篇文章分别完成两项任务：\n"
+        + SUMMARIZE_AND_CATEGORIZE_TASKS +
+        'Respond in strict JSON of the form {"results": [{"summary": "...", "category": "..."}]}, '
+        "with exactly one object per article, in the same order as the articles."
+    )
+    user_content = f"""
+【已有类别】:
+{category_list_str}
+
+{articles_str}
 """
-    payload = {
-        "model": config['model'],
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content.strip()}
-        ],
-        "temperature": 0.1,
-    }
+    result = await request_llm_json(client, system_prompt, user_content.strip(), f"批量生成 {len(items)} 篇文章的摘要并分类")
+    if result is None:
+        return None
+
+    results = result.get('results') if isinstance(result, dict) else None
+    if not isinstance(results, list) or len(results) != len(items):
+        count = len(results) if isinstance(results, list) else 0
+        print(f"    > 批量结果数量不符: 期望 {len(items)} 个，实际 {count} 个。", file=sys.stderr)
+        return None
+    return [_parse_summary_and_category(r) for r in results]
+
 
+# --- [新增] 通过 OpenAI Batch API 离线完成摘要与分类 ---
+async def _batch_api_request(client: httpx.AsyncClient, method: str, path: str, description: str, headers: dict | None = None, **kwargs) -> httpx.Response | None:
+    """
+    请求 Batch API 相关接口 (/files、/batches)，请求失败时打印错误并返回 None。
+    接口地址由 LLM_API_URL 去掉 '/chat/completions' 后缀得到。
+    """
+    import httpx
+
+    config = get_api_config()
+    url = f"{config['api_url'].removesuffix('/chat/completions')}{path}"
+    headers = {"Authorization": f"Bearer {config['api_key']}", **(headers or {})}
     try:
-        print("    > 正在通过 requests 请求 LLM 进行分类...")
-        response = requests.post(config['api_url'], headers=headers, json=payload, timeout=600)
-        response.raise_for_status()
-        response_data = response.json()
-        category = response_data['choices'][0]['message']['content'].strip()
-        # 移除AI可能返回的多余字符
-        category = re.sub(r'^[#*"\s]+|[#*"\s]+$', '', category)
-        return category
-    except requests.RequestException as e:
-        print(f"    > LLM API 分类请求失败 (网络错误): {e}", file=sys.stderr)
-        if e.response is not None:
-             print(f"    > 响应内容: {e.response.text}", file=sys.stderr)
+        response = await http_request_with_retry(client, method, url, headers=headers, **kwargs)
+    except httpx.HTTPError as e:
+        print(f"    > Batch API {description}失败 (网络错误): {e!r}", file=sys.stderr)
+        return None
+    if not response.is_success:
+        print(f"    > Batch API {description}失败 (HTTP {response.status_code})", file=sys.stderr)
+        print(f"    > 响应内容: {response.text}", file=sys.stderr)
         return None
-    except (KeyError, IndexError) as e:
-        print(f"    > 解析 LLM 分类响应失败: 意外的格式。错误: {e}", file=sys.stderr)
+    return response
+
+
+async def submit_batch(client: httpx.AsyncClient, prompts: dict[str, dict]) -> str | None:
+    """
+    将请求体写成 JSONL 上传 (purpose="batch")，并创建 24 小时完成窗口的批量任务。
+
+    Args:
+        prompts: custom_id -> Chat Completions 请求体。
+
+    Returns:
+        str: 批量任务 ID，失败时返回 None。
+    """
+    endpoint = urlparse(get_api_config()['api_url']).path
+    jsonl = b"".join(
+        orjson.dumps({"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body}) + b"\n"
+        for custom_id, body in prompts.items()
+    )
+
+    try:
+        print(f"    > 正在上传包含 {len(prompts)} 个请求的批量任务文件...")
+        response = await _batch_api_request(client, "POST", "/files", "上传批量任务文件", data={"purpose": "batch"}, files={"file": ("batch_input.jsonl", jsonl, "application/jsonl")})
+        if response is None:
+            return None
+        input_file_id = orjson.loads(response.content)['id']
+
+        batch_payload = {"input_file_id": input_file_id, "endpoint": endpoint, "completion_window": "24h"}
+        # 服务端可能已创建任务但响应失败，重发会产生重复计费的任务，因此只重试连接阶段的错误
+        response = await _batch_api_request(client, "POST", "/batches", "创建批量任务", headers={"Content-Type": "application/json"}, content=orjson.dumps(batch_payload), retry_statuses=())
+        if response is None:
+            return None
+        batch_id = orjson.loads(response.content)['id']
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"    > 解析 Batch API 响应失败: 意外的格式。错误: {e!r}", file=sys.stderr)
         return None
 
+    print(f"    > 已创建批量任务: {batch_id}")
+    return batch_id
+
+
+async def cancel_batch(client: httpx.AsyncClient, batch_id: str):
+    """
+    取消批量任务，避免回退为实时请求后批量任务仍继续执行并计费。
+    """
+    response = await _batch_api_request(client, "POST", f"/batches/{batch_id}/cancel", "取消批量任务")
+    if response is not None:
+        print(f"    > 已取消批量任务: {batch_id}")
+
+
+async def wait_for_batch(client: httpx.AsyncClient, batch_id: str) -> dict | None:
+    """
+    每隔 BATCH_API_POLL_INTERVAL 秒查询一次批量任务状态，直到任务结束或超过 BATCH_API_MAX_WAIT 秒。
+    等待超时时会取消该任务。
+
+    Returns:
+        dict: 已完成的批量任务对象，任务失败、过期、取消或等待超时时返回 None。
+    """
+    deadline = time.monotonic() + BATCH_API_MAX_WAIT
+    while True:
+        response = await _batch_api_request(client, "GET", f"/batches/{batch_id}", "查询批量任务状态")
+        if response is not None:
+            try:
+                batch = orjson.loads(response.content)
+                status = batch['status']
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"    > 解析批量任务状态失败: {e!r}", file=sys.stderr)
+            else:
+                if status == "completed":
+                    return batch
+                if status in ("failed", "expired", "cancelled"):
+                    print(f"    > 批量任务 {batch_id} 未完成，状态: {status}", file=sys.stderr)
+                    return None
+                print(f"    > 批量任务 {batch_id} 状态: {status}，{BATCH_API_POLL_INTERVAL} 秒后再次查询...")
+
+        if time.monotonic() >= deadline:
+            print(f"    > 批量任务 {batch_id} 等待超时 ({BATCH_API_MAX_WAIT} 秒)，正在取消...", file=sys.stderr)
+            await cancel_batch(client, batch_id)
+            return None
+        await asyncio.sleep(BATCH_API_POLL_INTERVAL)
+
+
+async def download_batch_results(client: httpx.AsyncClient, batch: dict) -> dict[str, tuple[str, str] | None]:
+    """
+    下载已完成批量任务的输出文件，按 custom_id 返回解析后的 (summary, category)。
+    """
+    output_file_id = batch.get('output_file_id')
+    if not output_file_id:
+        print("    > 批量任务没有输出文件。", file=sys.stderr)
+        return {}
+    response = await _batch_api_request(client, "GET", f"/files/{output_file_id}/content", "下载批量任务结果")
+    if response is None:
+        return {}
+
+    results = {}
+    for line in response.content.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = orjson.loads(line)
+            custom_id = item['custom_id']
+            body = item['response']['body']
+            result = orjson.loads(body['choices'][0]['message']['content'])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            print(f"    > 解析批量任务结果失败: 意外的格式。错误: {e!r}", file=sys.stderr)
+            continue
+        results[custom_id] = _parse_summary_and_category(result)
+    return results
+
+
+async def summarize_and_categorize_with_batch_api(client: httpx.AsyncClient, items: dict[str, tuple[str, str]], existing_categories: list[str]) -> dict[str, tuple[str, str] | None]:
+    """
+    通过 Batch API 为多篇文章生成摘要与分类。以延迟换取更低的调用成本，适合非交互式的 CI 任务。
+
+    Args:
+        items: custom_id -> (title, content)。
+
+    Returns:
+        dict: custom_id -> (summary, category)，未获得结果的文章不会出现在返回值中。
+    """
+    model = get_api_config()['model']
+    prompts = {}
+    for custom_id, (title, content) in items.items():
+        content = prepare_content_for_llm(content)
+        system_prompt, user_content = build_article_prompts(title, content, existing_categories)
+        prompts[custom_id] = build_llm_payload(model, system_prompt, user_content)
+
+    batch_id = await submit_batch(client, prompts)
+    if batch_id is None:
+        return {}
+    batch = await wait_for_batch(client, batch_id)
+    if batch is None:
+        return {}
+    return await download_batch_results(client, batch)
+
 
 # --- [新增] 使用 Cloudflare 获取微信公众号内容 ---
-def fetch_content_with_cloudflare(url: str) -> str | None:
+async def fetch_content_with_cloudflare(client: httpx.AsyncClient, url: str) -> str | None:
     """
     使用 Cloudflare 浏览器渲染和 AI Markdown 转换获取文章内容。
     专为解决微信公众号等难以抓取的网站设计。
     """
+    import httpx
+
     config = get_cloudflare_config()
     if not config:
         return None
@@ -172,6 +573,7 @@ def fetch_content_with_cloudflare(url: str) -> str | None:
     account_id = config["account_id"]
     api_token = config["api_token"]
 
+    # 渲染可能耗时较长，沿用客户端默认的 600 秒超时时间
     headers = {"Authorization": f"Bearer {api_token}"}
 
     # 第 1 步: 使用浏览器渲染获取 HTML
@@ -180,10 +582,13 @@ def fetch_content_with_cloudflare(url: str) -> str | None:
     
     try:
         print(f"    > 正在通过 Cloudflare 浏览器渲染获取 HTML: {url}")
-        # 渲染可能耗时较长，设置更长的超时时间
-        response = requests.post(render_url, headers={"Content-Type": "application/json", **headers}, json=render_payload, timeout=600)
-        response.raise_for_status()
-        render_data = response.json()
+        async with CLOUDFLARE_SEMAPHORE:
+            response = await http_request_with_retry(client, "POST", render_url, headers={"Content-Type": "application/json", **headers}, content=orjson.dumps(render_payload), retry_statuses=RETRY_STATUS_RATE_LIMITED)
+        if not response.is_success:
+            print(f"    > Cloudflare 浏览器渲染请求失败 (HTTP {response.status_code})", file=sys.stderr)
+            print(f"    > 响应内容: {response.text}", file=sys.stderr)
+            return None
+        render_data = orjson.loads(response.content)
 
         if not render_data.get("success"):
             print(f"    > Cloudflare 浏览器渲染失败: {render_data.get('errors')}", file=sys.stderr)
@@ -191,26 +596,27 @@ def fetch_content_with_cloudflare(url: str) -> str | None:
         
         html_content = render_data['result']
 
-    except requests.RequestException as e:
-        print(f"    > Cloudflare 浏览器渲染请求失败: {e}", file=sys.stderr)
-        if e.response is not None:
-             print(f"    > 响应内容: {e.response.text}", file=sys.stderr)
+    except httpx.HTTPError as e:
+        print(f"    > Cloudflare 浏览器渲染请求失败: {e!r}", file=sys.stderr)
         return None
-    except (KeyError, TypeError):
+    except (KeyError, TypeError, ValueError):
         print(f"    > Cloudflare 浏览器渲染响应格式不正确。", file=sys.stderr)
         return None
 
     # 第 2 步: 将 HTML 转换为 Markdown
     markdown_url = f"https://api.cloudflare.com/client/v4/accounts/{account_id}/ai/tomarkdown"
-    files = {
-        "files": ("virtual_file.html", html_content, "text/html")
-    }
+
+    files = {"files": ("virtual_file.html", html_content, "text/html")}
 
     try:
         print(f"    > 正在通过 Cloudflare AI 将 HTML 转换为 Markdown...")
-        response = requests.post(markdown_url, headers=headers, files=files, timeout=600)
-        response.raise_for_status()
-        markdown_data = response.json()
+        async with CLOUDFLARE_SEMAPHORE:
+            response = await http_request_with_retry(client, "POST", markdown_url, files=files, headers=headers, retry_statuses=RETRY_STATUS_RATE_LIMITED)
+        if not response.is_success:
+            print(f"    > Cloudflare AI Markdown 转换请求失败 (HTTP {response.status_code})", file=sys.stderr)
+            print(f"    > 响应内容: {response.text}", file=sys.stderr)
+            return None
+        markdown_data = orjson.loads(response.content)
 
         if not markdown_data.get("success"):
             print(f"    > Cloudflare AI Markdown 转换失败: {markdown_data.get('errors')}", file=sys.stderr)
@@ -226,20 +632,21 @@ def fetch_content_with_cloudflare(url: str) -> str | None:
             print("    > Cloudflare AI Markdown 转换未返回任何内容。", file=sys.stderr)
             return None
         return markdown_content.strip()
-    except requests.RequestException as e:
-        print(f"    > Cloudflare AI Markdown 转换请求失败: {e}", file=sys.stderr)
-        if e.response is not None:
-             print(f"    > 响应内容: {e.response.text}", file=sys.stderr)
+    except httpx.HTTPError as e:
+        print(f"    > Cloudflare AI Markdown 转换请求失败: {e!r}", file=sys.stderr)
         return None
 
 
-# --- Jina Reader 函数 (保持不变) ---
-def fetch_content_with_jina(url: str) -> str | None:
+# --- Jina Reader 函数 ---
+async def fetch_content_with_jina(client: httpx.AsyncClient, url: str) -> str | None:
+    import httpx
+
     jina_reader_url = f"https://r.jina.ai/{url}"
     headers = {"Accept": "text/plain", "User-Agent": "MyBookmarkProcessor/1.0"}
     try:
         print(f"    > 正在通过 Jina Reader 获取内容: {url}")
-        response = requests.get(jina_reader_url, headers=headers, timeout=60)
+        async with FETCH_SEMAPHORE:
+            response = await http_request_with_retry(client, "GET", jina_reader_url, headers=headers, timeout=60.0)
         response.raise_for_status()
         full_text = response.text
         if "Markdown Content:\n" in full_text:
@@ -248,153 +655,435 @@ def fetch_content_with_jina(url: str) -> str | None:
         else:
             print("    > 警告: Jina Reader 未返回预期的 'Markdown Content:' 格式。", file=sys.stderr)
             return full_text.strip()
-    except requests.RequestException as e:
-        print(f"    > Jina Reader API 请求失败: {e}", file=sys.stderr)
+    except httpx.HTTPError as e:
+        print(f"    > Jina Reader API 请求失败: {e!r}", file=sys.stderr)
         return None
 
 
 # --- [新增] 内容获取调度函数 ---
-def fetch_article_content(url: str) -> str | None:
+async def fetch_article_content(client: httpx.AsyncClient, url: str) -> str | None:
     """
     根据 URL 类型选择合适的抓取器 (Cloudflare 或 Jina)。
     优先处理微信公众号链接。
     """
     if "mp.weixin.qq.com" in url:
         print("  > 检测到微信公众号链接，将使用 Cloudflare 抓取...")
-        return fetch_content_with_cloudflare(url)
+        return await fetch_content_with_cloudflare(client, url)
     else:
         print("  > 使用 Jina Reader 抓取...")
-        return fetch_content_with_jina(url)
+        return await fetch_content_with_jina(client, url)
+
+
+# --- [新增] URL -> 摘要与分类 的持久化缓存 ---
+def open_cache(file_path: str) -> sqlite3.Connection | None:
+    """
+    打开 (必要时创建) SQLite 缓存数据库，失败时返回 None 并以无缓存模式继续。
+    """
+    try:
+        conn = sqlite3.connect(file_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache("
+            "url_hash TEXT PRIMARY KEY, summary TEXT, category TEXT, model TEXT, ts REAL)"
+        )
+        return conn
+    except sqlite3.Error as e:
+        print(f"警告: 无法打开缓存文件 '{file_path}': {e}，将不使用缓存。", file=sys.stderr)
+        return None
+
+
+def _url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def get_cached_result(conn: sqlite3.Connection, url: str, model: str) -> tuple[str, str] | None:
+    """
+    查询 URL 的缓存结果，仅当缓存由同一模型生成时才视为命中。
+    """
+    try:
+        row = conn.execute(
+            "SELECT summary, category FROM cache WHERE url_hash = ? AND model = ?",
+            (_url_hash(url), model)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"    > 读取缓存失败: {e}", file=sys.stderr)
+        return None
+    return (row[0], row[1]) if row else None
 
 
-# --- Git 和解析相关的函数 (保持不变) ---
-def parse_markdown_links_from_diff(diff_text: str) -> list:
-    link_pattern = re.compile(r'\[(.+?)\]\((.+?)\)')
-    extracted_links = []
-    for line in diff_text.splitlines():
+def store_cached_result(conn: sqlite3.Connection, url: str, model: str, summary: str, category: str):
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache(url_hash, summary, category, model, ts) VALUES (?, ?, ?, ?, ?)",
+                (_url_hash(url), summary, category, model, time.time())
+            )
+    except sqlite3.Error as e:
+        print(f"    > 写入缓存失败: {e}", file=sys.stderr)
+
+
+# --- [新增] 一组链接的抓取、摘要与分类流程 ---
+async def fetch_uncached_contents(client: httpx.AsyncClient, links: list[dict], results: list, cache: sqlite3.Connection | None, model: str) -> list[tuple[int, str]]:
+    """
+    命中缓存的链接直接写入 results，其余链接并发抓取内容。
+
+    Returns:
+        list: 成功抓取内容的 (链接下标, content) 列表。
+    """
+    pending = []
+    for i, link_data in enumerate(links):
+        if cache is not None:
+            cached = get_cached_result(cache, link_data['url'], model)
+            if cached:
+                print(f"  > 命中缓存，跳过抓取与 LLM 请求: {link_data['url']}")
+                results[i] = cached
+                continue
+        pending.append(i)
+
+    # 单个链接抓取时抛出异常只影响该链接，不影响同一批次中的其他链接
+    contents = await asyncio.gather(*(fetch_article_content(client, links[i]['url']) for i in pending), return_exceptions=True)
+    fetched = []
+    for i, content in zip(pending, contents):
+        if isinstance(content, BaseException):
+            print(f"  内容获取: 发生异常 {content!r}，跳过摘要生成。({links[i]['url']})", file=sys.stderr)
+        elif content:
+            fetched.append((i, content))
+        else:
+            print(f"  内容获取: 失败，跳过摘要生成。({links[i]['url']})", file=sys.stderr)
+    return fetched
+
+
+async def finish_fetched_results(client: httpx.AsyncClient, links: list[dict], fetched: list[tuple[int, str]], results: list, existing_categories: list[str], cache: sqlite3.Connection | None, model: str):
+    """
+    对尚未得到结果的文章逐篇发起单独请求，并将成功的结果写入缓存。
+    """
+    remaining = [(i, content) for i, content in fetched if results[i] is None]
+    single_results = await asyncio.gather(*(
+        summarize_and_categorize_with_openai(client, links[i]['title'], content, existing_categories)
+        for i, content in remaining
+    ))
+    for (i, _), result in zip(remaining, single_results):
+        results[i] = result
+
+    for i, _ in fetched:
+        if not results[i]:
+            print(f"  AI 摘要与分类: 生成失败。({links[i]['url']})", file=sys.stderr)
+        elif cache is not None:
+            store_cached_result(cache, links[i]['url'], model, *results[i])
+
+
+async def process_batch(client: httpx.AsyncClient, batch: list[dict], existing_categories: list[str], cache: sqlite3.Connection | None = None) -> list[tuple[str, str] | None]:
+    """
+    处理一组链接：命中缓存的直接返回结果，其余链接并发抓取内容后，
+    合并为一次 LLM 请求生成摘要与分类。批量请求失败时逐篇回退为单独请求。
+    各接口的并发与速率限制由对应的请求函数自行控制。
+
+    Returns:
+        list: 与 batch 一一对应的 (summary, category)，任一步骤失败时对应项为 None。
+    """
+    model = get_api_config()['model']
+    results = [None] * len(batch)
+    fetched = await fetch_uncached_contents(client, batch, results, cache, model)
+
+    if len(fetched) > 1:
+        batch_results = await summarize_and_categorize_batch(
+            client,
+            [(batch[i]['title'], content) for i, content in fetched],
+            existing_categories
+        )
+        if batch_results is None:
+            print("    > 批量摘要与分类失败，回退为逐篇请求...", file=sys.stderr)
+        else:
+            for (i, _), result in zip(fetched, batch_results):
+                results[i] = result
+
+    # 单篇文章，或批量结果中缺失的文章，逐篇单独请求
+    await finish_fetched_results(client, batch, fetched, results, existing_categories, cache, model)
+    return results
+
+
+async def process_with_batch_api(client: httpx.AsyncClient, links: list[dict], existing_categories: list[str], cache: sqlite3.Connection | None = None) -> list[tuple[str, str] | None]:
+    """
+    抓取所有链接的内容后，一次性提交到 Batch API 生成摘要与分类，以 URL 哈希作为 custom_id 匹配结果。
+    未能从批量任务获得结果的文章回退为实时请求。
+
+    Returns:
+        list: 与 links 一一对应的 (summary, category)，任一步骤失败时对应项为 None。
+    """
+    model = get_api_config()['model']
+    results = [None] * len(links)
+    fetched = await fetch_uncached_contents(client, links, results, cache, model)
+
+    items = {}
+    for i, content in fetched:
+        items.setdefault(_url_hash(links[i]['url']), (links[i]['title'], content))
+    if items:
+        batch_results = await summarize_and_categorize_with_batch_api(client, items, existing_categories)
+        for i, _ in fetched:
+            results[i] = batch_results.get(_url_hash(links[i]['url']))
+
+    missing = sum(1 for i, _ in fetched if results[i] is None)
+    if missing:
+        print(f"    > {missing} 篇文章未从批量任务获得结果，回退为实时请求...", file=sys.stderr)
+    await finish_fetched_results(client, links, fetched, results, existing_categories, cache, model)
+    return results
+
+
+# --- Git 和解析相关的函数 ---
+def parse_markdown_links_from_diff(diff_lines: Iterable[str]) -> Iterator[dict]:
+    """
+    逐行扫描 diff，从新增的行中提取 Markdown 链接。
+    """
+    for line in diff_lines:
         if line.startswith('+') and not line.startswith('+++'):
             content = line[1:].strip()
-            matches = link_pattern.findall(content)
-            for title, url in matches:
-                extracted_links.append({'title': title.strip(), 'url': url.strip()})
-    return extracted_links
+            for title, url in _LINK_RE.findall(content):
+                yield {'title': title.strip(), 'url': url.strip()}
 
-def get_file_last_change_diff_text(file_path: str, repo_path: str) -> str | None:
+def iter_diff_lines(file_path: str, repo_path: str) -> Iterator[str]:
+    """
+    流式输出文件最后一次变更的 diff，避免将整个 diff 读入内存。
+    只需一次 git log -p 调用，无需先查询提交哈希再执行 git diff。
+    """
     if not os.path.isdir(os.path.join(repo_path, '.git')):
         print(f"错误: '{repo_path}' 不是一个有效的 Git 仓库。", file=sys.stderr)
-        return None
-    try:
-        log_command = ['git', 'log', '-n', '2', '--pretty=%H', '--', file_path]
-        result = subprocess.run(log_command, cwd=repo_path, capture_output=True, text=True, check=True)
-        hashes = [h for h in result.stdout.strip().split('\n') if h]
-    except subprocess.CalledProcessError as e:
-        print(f"错误：无法获取 '{file_path}' 的提交历史: {e.stderr.strip()}", file=sys.stderr)
-        return None
-    if len(hashes) < 2:
-        print(f"文件 '{file_path}' 只有一个或没有变更历史，无法进行对比。")
-        return None
-    newer_commit, older_commit = hashes[0], hashes[1]
-    print(f"对比文件 '{file_path}' 的最后两次变更 (from {older_commit[:7]} to {newer_commit[:7]})")
-    print("=" * 60)
-    try:
-        diff_command = ['git', 'diff', older_commit, newer_commit, '--', file_path]
-        diff_result = subprocess.run(diff_command, cwd=repo_path, capture_output=True, text=True, check=True)
-        return diff_result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"错误：执行 git diff 失败: {e.stderr.strip()}", file=sys.stderr)
-        return None
+        return
+    # 合并提交默认不输出 diff，改为与其第一个父提交对比，与 git diff <上一次提交> <合并提交> 一致
+    log_command = ['git', 'log', '-n', '1', '-p', '--diff-merges=first-parent', '--unified=0', '--pretty=format:%H', '--', file_path]
+    with subprocess.Popen(log_command, cwd=repo_path, stdout=subprocess.PIPE, text=True) as process:
+        commit = process.stdout.readline().strip()
+        if not commit:
+            if process.wait() != 0:
+                print(f"错误：无法获取 '{file_path}' 的提交历史 (退出码 {process.returncode})。", file=sys.stderr)
+            else:
+                print(f"文件 '{file_path}' 没有变更历史，无法进行对比。")
+            return
+        print(f"对比文件 '{file_path}' 的最后一次变更 ({commit[:7]})")
+        print("=" * 60)
+        for line in process.stdout:
+            # 文件在这次提交中才被创建，即只有一次变更历史
+            if line.startswith('--- /dev/null'):
+                print(f"文件 '{file_path}' 只有一个变更历史，无法进行对比。")
+                process.kill()
+                return
+            yield line
+    if process.returncode != 0:
+        print(f"错误：执行 git log -p 失败 (退出码 {process.returncode})。", file=sys.stderr)
 
 
 # --- 文件处理函数 ---
-def parse_categories_from_file(file_path: str) -> list[str]:
+def _parse_category_name(stripped_line: str) -> str | None:
+    """
+    若该行是 H2(##) 或 H3(###) 标题，返回其中的分类名称，否则返回 None。
+    """
+    if stripped_line.startswith('## ') or stripped_line.startswith('### '):
+        header_content = stripped_line.lstrip('#').strip()
+        parts = header_content.split(maxsplit=1)
+        return parts[-1]
+    return None
+
+
+def load_category_file(file_path: str) -> tuple[list[str], OrderedDict[str, dict]] | None:
     """
-    从文件中解析H2(##)和H3(###)标题作为分类。
+    一次性读取分类文件，解析为内存中的分类模型。
+
+    Returns:
+        tuple: (header, sections)。header 是第一个分类标题之前的行；
+        sections 按文件顺序以分类名称为键，值为 {"head": 标题及简介行, "articles": 文章块队列 (deque，便于在顶部插入),
+        "new": 是否为本次新建的分类, "modified": 文件中已有的分类是否被修改}。
+        支持H2和H3级别的分类。文件不存在时返回仅含默认标题的空模型，读取失败时返回 None。
     """
+    header = ["# 网站资源分类整理\n", "\n"]
+    sections = OrderedDict()
     if not os.path.exists(file_path):
-        return []
-    categories = []
+        return header, sections
+
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('## ') or line.startswith('### '):
-                    header_content = line.lstrip('#').strip()
-                    parts = header_content.split(maxsplit=1)
-                    category_name = parts[-1]
-                    categories.append(category_name)
+            lines = f.readlines()
     except IOError as e:
         print(f"错误: 无法读取分类文件 '{file_path}': {e}", file=sys.stderr)
-    return categories
+        return None
+
+    header = []
+    current = header
+    section = None
+    for line in lines:
+        stripped_line = line.strip()
+        name = _parse_category_name(stripped_line)
+        # 重名的分类标题保留在原位置，新文章只会插入到第一个同名分类下
+        if name is not None and name not in sections:
+            section = {"head": [], "articles": [], "new": False, "modified": False}
+            sections[name] = section
+            current = section["head"]
+        elif section is not None and stripped_line.startswith("**标题:**"):
+            current = []
+            section["articles"].append(current)
+        current.append(line)
+
+    for section in sections.values():
+        section["articles"] = deque(''.join(block) for block in section["articles"])
+    return header, sections
+
 
-def insert_article_to_category_file(file_path: str, category: str, title: str, url: str, summary: str):
+def _tail_line(text: str) -> str:
     """
-    将文章插入到指定的分类下，支持H2和H3级别的分类。
+    返回文本的最后一行 (包含换行符)，无需像 splitlines() 那样拆分出所有行。
     """
-    try:
-        if not os.path.exists(file_path):
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(f"# 网站资源分类整理\n\n")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-    except IOError as e:
-        print(f"错误: 读写文件 '{file_path}' 失败: {e}", file=sys.stderr)
-        return
+    end = len(text) - 1 if text.endswith('\n') else len(text)
+    return text[text.rfind('\n', 0, end) + 1:]
+
 
+def _last_line(header: list[str], sections: OrderedDict[str, dict]) -> str:
+    """
+    返回分类模型序列化后的最后一行，用于决定新分类前是否需要补充空行。
+    """
+    for section in reversed(sections.values()):
+        for part in (reversed(section["articles"]), reversed(section["head"])):
+            for text in part:
+                if text:
+                    return _tail_line(text)
+    for text in reversed(header):
+        if text:
+            return _tail_line(text)
+    return ""
+
+
+def insert_into_model(header: list[str], sections: OrderedDict[str, dict], category: str, title: str, url: str, summary: str):
+    """
+    将文章插入到内存模型中指定分类的顶部，分类不存在时在末尾创建。
+    """
     article_text = f"**标题:** {title}\n\n**链接:** {url}\n\n**摘要:** {summary}"
-    category_header_index = -1
 
-    for i, line in enumerate(lines):
-        stripped_line = line.strip()
-        if stripped_line.startswith('## ') or stripped_line.startswith('### '):
-            header_content = stripped_line.lstrip('#').strip()
-            parts = header_content.split(maxsplit=1)
-            name_in_header = parts[-1]
-            if name_in_header == category:
-                category_header_index = i
-                break
-
-    if category_header_index != -1:
+    section = sections.get(category)
+    if section is not None:
         print(f"    > 分类 '{category}' 已存在，正在查找插入位置...")
-        first_article_index = -1
-        for i in range(category_header_index + 1, len(lines)):
-            if lines[i].strip().startswith("**标题:**"):
-                first_article_index = i
-                break
-
-        if first_article_index != -1:
-            insertion_text = f"{article_text}\n\n---\n\n"
-            lines.insert(first_article_index, insertion_text)
+        if not section["new"]:
+            section["modified"] = True
+        if section["articles"]:
+            section["articles"].appendleft(f"{article_text}\n\n---\n\n")
             print(f"    -> 成功将文章插入到 '{category}' 分类顶部。")
         else:
-            end_of_section_index = len(lines)
-            for i in range(category_header_index + 1, len(lines)):
-                if lines[i].startswith("##"):
-                    end_of_section_index = i
-                    break
-            insertion_text = f"\n{article_text}\n"
-            lines.insert(end_of_section_index, insertion_text)
+            # 保证标题/简介与文章之间有一个空行
+            head = section["head"]
+            if head and not head[-1].endswith('\n'):
+                head[-1] += '\n'
+            if head and head[-1].strip() != "":
+                head.append("\n")
+            # 后面还有其他分类时，文章与下一个标题之间保留一个空行
+            is_last = next(reversed(sections)) == category
+            section["articles"].append(f"{article_text}\n" if is_last else f"{article_text}\n\n")
             print(f"    -> 成功将文章添加到空的 '{category}' 分类下。")
     else:
         print(f"    > 分类 '{category}' 是新分类，将在文件末尾创建。")
-        if lines and not lines[-1].endswith('\n'):
-            lines.append("\n")
-        if lines and lines[-1].strip() != "":
-            lines.append("\n")
+        head = []
+        last_line = _last_line(header, sections)
+        if last_line and (not last_line.endswith('\n') or last_line.strip() != ""):
+            head.append("\n")
         emojis = ["🧩", "🔧", "💡", "📚", "🧭", "✨"]
-        new_category_header = f"## {random.choice(emojis)} {category}\n"
-        lines.append(new_category_header)
-        lines.append("\n")
-        lines.append(f"{article_text}\n")
+        # 按分类名称的哈希选择图标，保证同一分类每次运行生成相同的标题
+        emoji = emojis[zlib.crc32(category.encode('utf-8')) % len(emojis)]
+        head.append(f"## {emoji} {category}\n")
+        head.append("\n")
+        sections[category] = {"head": head, "articles": deque([f"{article_text}\n"]), "new": True, "modified": False}
+
+
+def _section_parts(sections: Iterable[dict]) -> list[str]:
+    parts = []
+    for section in sections:
+        parts.extend(section["head"])
+        parts.extend(section["articles"])
+    return parts
+
 
+def write_category_file(file_path: str, header: list[str], sections: OrderedDict[str, dict]):
+    """
+    将内存中的分类模型一次性写回文件。
+    若文件中已有的分类均未被修改，只需把新建的分类追加到文件末尾，无需重写整个文件。
+    """
+    new_sections = [section for section in sections.values() if section["new"]]
+    append_only = os.path.exists(file_path) and not any(section["modified"] for section in sections.values())
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
+        if append_only:
+            print(f"  > 已有分类未变化，以追加方式写入 {len(new_sections)} 个新分类。")
+            with open(file_path, 'a', encoding='utf-8') as f:
+                f.writelines(_section_parts(new_sections))
+        else:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.writelines(header)
+                f.writelines(_section_parts(sections.values()))
     except IOError as e:
         print(f"错误: 写入文件 '{file_path}' 失败: {e}", file=sys.stderr)
 
 
+# --- [新增] 并发处理所有链接 ---
+async def process_links(extracted_links: list, header: list[str], sections: OrderedDict[str, dict], cache: sqlite3.Connection | None = None) -> int:
+    """
+    并发抓取内容并生成摘要与分类，再按原顺序串行归档到内存中的分类模型，
+    以保证分类列表与归档顺序不会产生竞争。
+
+    Returns:
+        int: 成功归档的文章数量。
+    """
+    # 并发请求共享同一份分类快照，本轮新建的分类在归档阶段再合并
+    categories_snapshot = list(sections)
+    archived = 0
+    if USE_BATCH_API:
+        # 所有链接作为一个整体提交，结果与 extracted_links 一一对应
+        batches = [extracted_links]
+        async with create_http_client() as client:
+            batch_results = await asyncio.gather(
+                process_with_batch_api(client, extracted_links, categories_snapshot, cache),
+                return_exceptions=True
+            )
+    else:
+        batches = [extracted_links[i:i + BATCH_SIZE] for i in range(0, len(extracted_links), BATCH_SIZE)]
+        async with create_http_client() as client:
+            tasks = [process_batch(client, batch, categories_snapshot, cache) for batch in batches]
+            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = []
+    for batch, batch_result in zip(batches, batch_results):
+        if isinstance(batch_result, Exception):
+            results.extend([batch_result] * len(batch))
+        else:
+            results.extend(batch_result)
+
+    for i, (link_data, result) in enumerate(zip(extracted_links, results)):
+        print(f"--- 处理第 {i+1}/{len(extracted_links)} 个链接 ---")
+        print(f"  原始标题: {link_data['title']}")
+        print(f"  原始链接: {link_data['url']}")
+
+        if isinstance(result, Exception):
+            print(f"  [失败] 处理链接时发生异常: {result!r}，跳过归档。\n", file=sys.stderr)
+            continue
+
+        if not result:
+            print("  [失败] 内容获取或 AI 摘要与分类失败，跳过归档。\n")
+            continue
+
+        summary, chosen_category = result
+        print(f"  AI 摘要: {summary}")
+        print(f"  AI 分类: {chosen_category}")
+        insert_into_model(
+            header,
+            sections,
+            chosen_category,
+            link_data['title'],
+            link_data['url'],
+            summary
+        )
+        archived += 1
+        print(f"  [成功] 文章已归档到 '{chosen_category}' 分类。\n")
+
+    return archived
+
+
 # --- [已修改] 主程序入口 ---
-if __name__ == "__main__":
+async def main():
+    parser = argparse.ArgumentParser(description="自动化书签处理与归档脚本")
+    parser.add_argument("--no-cache", action="store_true", help=f"不读取也不写入本地缓存 '{CACHE_FILE}'")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🚀 启动自动化书签处理与归档脚本 🚀")
     
@@ -406,69 +1095,54 @@ if __name__ == "__main__":
 
     print(f"  - 输入文件: {INPUT_FILE}")
     print(f"  - 归档文件: {CATEGORY_FILE}")
+    print(f"  - 结果缓存: {'已禁用' if args.no_cache else CACHE_FILE}")
     print(f"  - LLM 模型: {api_config['model']}")
+    print(f"  - LLM 并发: {LLM_CONCURRENCY} (每分钟上限: {LLM_RPM or '不限'})")
+    if USE_BATCH_API:
+        print(f"  - 调用方式: Batch API (最长等待 {BATCH_API_MAX_WAIT} 秒)")
+    else:
+        print(f"  - 批量大小: {BATCH_SIZE}")
     print("-" * 60)
 
     # 仓库路径，默认为当前目录，也可通过环境变量配置
     repository_path = os.getenv("GIT_REPO_PATH", ".")
     
-    # 获取文件变更
-    diff_output = get_file_last_change_diff_text(INPUT_FILE, repository_path)
+    # 获取文件变更中新增的链接
+    extracted_links = list(parse_markdown_links_from_diff(iter_diff_lines(INPUT_FILE, repository_path)))
 
-    if diff_output:
-        extracted_links = parse_markdown_links_from_diff(diff_output)
+    # 没有新增链接时直接结束，无需解析分类文件或建立网络连接
+    if not extracted_links:
+        print("在本次变更中没有找到新增的 Markdown 链接。")
+        print("=" * 60)
+        return
 
-        if not extracted_links:
-            print("在本次变更中没有找到新增的 Markdown 链接。")
-        else:
-            print(f"解析到 {len(extracted_links)} 个新增链接，正在处理...\n")
-            
-            print(f"--- 准备工作 ---")
-            print(f"  > 正在从 '{CATEGORY_FILE}' 解析现有分类...")
-            existing_categories = parse_categories_from_file(CATEGORY_FILE)
-            if existing_categories:
-                print(f"  > 已找到 {len(existing_categories)} 个分类: {', '.join(existing_categories)}\n")
-            else:
-                print(f"  > 未找到任何现有分类，将由 AI 自动创建。\n")
-
-            for i, link_data in enumerate(extracted_links):
-                print(f"--- 处理第 {i+1}/{len(extracted_links)} 个链接 ---")
-                print(f"  原始标题: {link_data['title']}")
-                print(f"  原始链接: {link_data['url']}")
-
-                # [修改] 使用新的调度函数获取内容
-                content = fetch_article_content(link_data['url'])
-
-                if content:
-                    summary = summarize_with_openai(content)
-                    if summary:
-                        print(f"  AI 摘要: {summary}")
-                        
-                        chosen_category = categorize_with_openai(
-                            link_data['title'], 
-                            summary, 
-                            existing_categories
-                        )
-                        
-                        if chosen_category:
-                            print(f"  AI 分类: {chosen_category}")
-                            insert_article_to_category_file(
-                                CATEGORY_FILE,
-                                chosen_category,
-                                link_data['title'],
-                                link_data['url'],
-                                summary
-                            )
-                            # 如果AI创建了一个全新的分类，将其加入列表，供后续链接使用
-                            if chosen_category not in existing_categories:
-                                existing_categories.append(chosen_category)
-                            print(f"  [成功] 文章已自动归档到 '{CATEGORY_FILE}'。\n")
-                        else:
-                            print("  [失败] AI 分类生成失败，跳过归档。\n")
-                    else:
-                        print("  AI 摘要: 生成失败。\n")
-                else:
-                    print("  内容获取: 失败，跳过摘要生成。\n")
-            print("=" * 60)
-            print("所有链接处理完毕。")
-    print("=" * 60)
\ No newline at end of file
+    print(f"解析到 {len(extracted_links)} 个新增链接，正在处理...\n")
+    
+    print(f"--- 准备工作 ---")
+    print(f"  > 正在从 '{CATEGORY_FILE}' 解析现有分类...")
+    category_model = load_category_file(CATEGORY_FILE)
+    if category_model is None:
+        sys.exit(1)
+    header, sections = category_model
+    if sections:
+        print(f"  > 已找到 {len(sections)} 个分类: {', '.join(sections)}\n")
+    else:
+        print(f"  > 未找到任何现有分类，将由 AI 自动创建。\n")
+
+    cache = None if args.no_cache else open_cache(CACHE_FILE)
+    try:
+        archived = await process_links(extracted_links, header, sections, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if archived:
+        write_category_file(CATEGORY_FILE, header, sections)
+        print(f"已将 {archived} 篇文章写入 '{CATEGORY_FILE}'。")
+    print("=" * 60)
+    print("所有链接处理完毕。")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import process_bookmarks as pb
+
+
+def _git(repo: str, *args: str):
+    subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+        cwd=repo, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def _write(repo: str, name: str, text: str):
+    with open(os.path.join(repo, name), 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+class IterDiffLinesTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.repo = self._tmp.name
+        _git(self.repo, 'init', '-q', '-b', 'main')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def extract_links(self) -> list[dict]:
+        return list(pb.parse_markdown_links_from_diff(pb.iter_diff_lines('README.md', self.repo)))
+
+    def test_last_commit(self):
+        _write(self.repo, 'README.md', '- [A](http://a)\n')
+        _git(self.repo, 'add', 'README.md')
+        _git(self.repo, 'commit', '-qm', 'init')
+        _write(self.repo, 'README.md', '- [A](http://a)\n- [B](http://b)\n')
+        _git(self.repo, 'commit', '-qam', 'add B')
+
+        self.assertEqual(self.extract_links(), [{'title': 'B', 'url': 'http://b'}])
+
+    def test_merge_commit_diffs_against_first_parent(self):
+        """README.md 在两个分支上都被修改时，最后一次变更是合并提交。"""
+        _write(self.repo, 'README.md', '- [A](http://a)\n\ntext\n')
+        _git(self.repo, 'add', 'README.md')
+        _git(self.repo, 'commit', '-qm', 'init')
+        _git(self.repo, 'checkout', '-qb', 'feature')
+        _write(self.repo, 'README.md', '- [A](http://a)\n- [F](http://f)\n\ntext\n')
+        _git(self.repo, 'commit', '-qam', 'add F')
+        _git(self.repo, 'checkout', '-q', 'main')
+        _write(self.repo, 'README.md', '- [A](http://a)\n\ntext on main\n')
+        _git(self.repo, 'commit', '-qam', 'edit main')
+        _git(self.repo, 'merge', '-q', '--no-edit', 'feature')
+
+        self.assertEqual(self.extract_links(), [{'title': 'F', 'url': 'http://f'}])
+
+
+class InsertIntoModelTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'category.md')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def insert_all(self, text: str, articles: list[tuple[str, str, str, str]]) -> str:
+        _write(self._tmp.name, 'category.md', text)
+        header, sections = pb.load_category_file(self.path)
+        for category, title, url, summary in articles:
+            pb.insert_into_model(header, sections, category, title, url, summary)
+        pb.write_category_file(self.path, header, sections)
+        with open(self.path, encoding='utf-8') as f:
+            return f.read()
+
+    def test_h2_with_only_h3_children(self):
+        text = (
+            "# 分类\n\n"
+            "## 💻 编程语言\n\n简介\n\n"
+            "### Go\n\n**标题:** G\n\n**链接:** http://g\n\n**摘要:** sg\n\n"
+            "## 🧩 杂项\n\n**标题:** M\n\n**链接:** http://m\n\n**摘要:** sm\n"
+        )
+        result = self.insert_all(text, [
+            ("编程语言", "A", "http://a", "sa"),
+            ("编程语言", "B", "http://b", "sb"),
+        ])
+        self.assertEqual(result, (
+            "# 分类\n\n"
+            "## 💻 编程语言\n\n简介\n\n"
+            "**标题:** B\n\n**链接:** http://b\n\n**摘要:** sb\n\n---\n\n"
+            "**标题:** A\n\n**链接:** http://a\n\n**摘要:** sa\n\n"
+            "### Go\n\n**标题:** G\n\n**链接:** http://g\n\n**摘要:** sg\n\n"
+            "## 🧩 杂项\n\n**标题:** M\n\n**链接:** http://m\n\n**摘要:** sm\n"
+        ))
+
+    def test_last_section_without_articles(self):
+        text = "# 分类\n\n## 🧩 杂项\n"
+        result = self.insert_all(text, [
+            ("杂项", "A", "http://a", "sa"),
+            ("杂项", "B", "http://b", "sb"),
+        ])
+        self.assertEqual(result, (
+            "# 分类\n\n## 🧩 杂项\n\n"
+            "**标题:** B\n\n**链接:** http://b\n\n**摘要:** sb\n\n---\n\n"
+            "**标题:** A\n\n**链接:** http://a\n\n**摘要:** sa\n"
+        ))
+
+
+async def _fake_fetch(client, url: str) -> str:
+    if url == 'http://broken':
+        raise KeyError(0)
+    return f"content of {url}"
+
+
+async def _fake_batch(client, items, existing_categories):
+    return [(f"summary of {title}", "分类") for title, _ in items]
+
+
+async def _fake_batch_api(client, items, existing_categories):
+    return {custom_id: (f"summary of {title}", "分类") for custom_id, (title, _) in items.items()}
+
+
+async def _fake_single(client, title, content, existing_categories):
+    return f"summary of {title}", "分类"
+
+
+class FetchFailureIsolationTest(unittest.IsolatedAsyncioTestCase):
+    """单个链接抓取时抛出异常，不应影响同一批次中的其他链接。"""
+
+    links = [
+        {'title': 'A', 'url': 'http://a'},
+        {'title': 'broken', 'url': 'http://broken'},
+        {'title': 'B', 'url': 'http://b'},
+    ]
+    expected = [("summary of A", "分类"), None, ("summary of B", "分类")]
+
+    def setUp(self):
+        for target, value in (
+            ('get_api_config', lambda: {'model': 'test-model'}),
+            ('fetch_article_content', _fake_fetch),
+            ('summarize_and_categorize_batch', _fake_batch),
+            ('summarize_and_categorize_with_batch_api', _fake_batch_api),
+            ('summarize_and_categorize_with_openai', _fake_single),
+        ):
+            patcher = mock.patch.object(pb, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_process_batch(self):
+        self.assertEqual(await pb.process_batch(None, self.links, []), self.expected)
+
+    async def test_process_with_batch_api(self):
+        """Batch API 模式下所有链接同属一个批次，异常的影响范围更大。"""
+        self.assertEqual(await pb.process_with_batch_api(None, self.links, []), self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()